@@ -1,15 +1,29 @@
 #!/usr/bin/env python
 
-from collections import namedtuple
+from array import array
+from bisect import bisect_left, bisect_right
+import codecs
 from dataclasses import dataclass
+import functools
 import gzip
-from io import BytesIO
+import hashlib
+import json
 from multiprocessing import Event
+import os
 from socket import AF_INET, IPPROTO_TCP, SOCK_STREAM, socket
-from typing import Dict, List, NamedTuple, Tuple
+from typing import Dict, List, Set, Tuple
+import re
 import ssl
+import time
 import tkinter
 
+try:
+    # libdeflate bindings: roughly 2x faster than zlib for one-shot
+    # decompression. Optional; zlib-backed streaming works without it.
+    import deflate
+except ImportError:
+    deflate = None
+
 DEFAULT_HTTP_PORT = 80
 HTTP_PROTOCOL_PREFIX = "http://"
 URL_PATH_SEP = "/"
@@ -19,48 +33,68 @@ NEWLINE = "\r\n"
 ENCODING_UTF8 = "utf8"
 ENCODING_GZIP = "gzip"
 
+NEWLINE_BYTES = NEWLINE.encode(ENCODING_UTF8)
+
 HEADER_CONTENT_ENCODING = "content-encoding"
 HEADER_ACCEPT_ENCODING = "accept-encoding"
+HEADER_CONTENT_LENGTH = "content-length"
+HEADER_TRANSFER_ENCODING = "transfer-encoding"
+HEADER_CONNECTION = "connection"
+HEADER_CACHE_CONTROL = "cache-control"
+HEADER_ETAG = "etag"
+HEADER_LAST_MODIFIED = "last-modified"
+HEADER_IF_NONE_MATCH = "if-none-match"
+HEADER_IF_MODIFIED_SINCE = "if-modified-since"
+
+STATUS_OK = "200"
+STATUS_NOT_MODIFIED = "304"
+
+TRANSFER_ENCODING_CHUNKED = "chunked"
+CONNECTION_KEEP_ALIVE = "keep-alive"
+CONNECTION_CLOSE = "close"
 
 WIDTH, HEIGHT = 800, 600
 SCROLL_STEP = 100
 
-
-class Point(NamedTuple):
-    x: int
-    y: int
-
-
-class Character(NamedTuple):
-    loc: Point
-    char: str
+# Rows are drawn one string at a time, so glyph positions within a row
+# come from the font; it must be fixed-width to line up with HSTEP.
+FIXED_FONT = ("Courier", 13)
 
 
 HSTEP, VSTEP = 13, 18
 
-
-def layout(text: str):
-    display_list: List[Character] = []
-
-    cursor_x, cursor_y = HSTEP, VSTEP
-    for c in text:
-        if c == "\n":
-            cursor_x = HSTEP
-            cursor_y += 2 * VSTEP
-            continue
-
-        display_list.append(
-            Character(loc=Point(x=cursor_x, y=cursor_y), char=c),
-        )
-        cursor_x += HSTEP
-        if cursor_x >= WIDTH - HSTEP:
+# How many glyphs fit on one visual row before wrapping.
+ROW_CAPACITY = (WIDTH - HSTEP - 1) // HSTEP
+
+
+def layout(text: str) -> Tuple[array, array, List[str]]:
+    """Lay out `text` as one run per visual row, held in three parallel
+    columns (structure-of-arrays): run start x, run y, and the run's
+    text. The int columns are array.array('i') buffers of unboxed C
+    ints. Whole rows let draw() paint each run with a single canvas
+    call instead of one per glyph."""
+    xs = array("i")
+    ys = array("i")
+    lines: List[str] = []
+
+    cursor_y = VSTEP
+    for line in text.split("\n"):
+        full_rows, tail = divmod(len(line), ROW_CAPACITY)
+        for row in range(full_rows):
+            xs.append(HSTEP)
+            ys.append(cursor_y)
+            lines.append(line[row * ROW_CAPACITY : (row + 1) * ROW_CAPACITY])
             cursor_y += VSTEP
-            cursor_x = HSTEP
+        if tail:
+            xs.append(HSTEP)
+            ys.append(cursor_y)
+            lines.append(line[len(line) - tail :])
+        cursor_y += 2 * VSTEP
 
-    return display_list
+    return xs, ys, lines
 
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class URL:
     raw: str
     host: str
@@ -70,74 +104,631 @@ class URL:
 
     @staticmethod
     def parse(url: str) -> "URL":
-        raw = url
-        scheme, url = url.split("://", 1)
-        assert scheme in ["http", "https"]
-        port = 80 if scheme == "http" else 443
+        return _parse_url(url)
+
+
+@functools.lru_cache(maxsize=1024)
+def _parse_url(url: str) -> URL:
+    raw = url
+    scheme, url = url.split("://", 1)
+    assert scheme in ["http", "https"]
+    port = 80 if scheme == "http" else 443
+
+    if URL_PATH_SEP not in url:
+        url += URL_PATH_SEP
+
+    host, path = url.split(URL_PATH_SEP, maxsplit=1)
+    if ":" in host:
+        host, port = host.split(":", 1)
+        port = int(port)
+
+    path = URL_PATH_SEP + path
+
+    return URL(raw=raw, host=host, path=path, port=port, scheme=scheme)
+
+
+_RECV_SIZE = 65536
+_HEADER_END = NEWLINE_BYTES * 2
+
+
+class _SocketReader:
+    """Minimal buffered reader over a socket. The kernel recv_into()s
+    straight into one preallocated scratch buffer, reused for every
+    receive; whatever a caller doesn't consume stays buffered for the
+    next read -- including body bytes delivered in the same segment as
+    the headers. Consumption advances an offset instead of shifting the
+    buffer, and slices go through memoryview to avoid extra copies."""
+
+    def __init__(self, s: socket) -> None:
+        self.sock = s
+        self.buf = bytearray()
+        self.pos = 0  # start of the unconsumed bytes in buf
+        self._scratch = bytearray(_RECV_SIZE)
+
+    def _pending(self) -> int:
+        return len(self.buf) - self.pos
+
+    def _fill(self) -> bool:
+        n = self.sock.recv_into(self._scratch)
+        if n == 0:
+            return False
+        if self.pos:
+            # Drop already-consumed bytes before growing the buffer.
+            del self.buf[: self.pos]
+            self.pos = 0
+        self.buf += memoryview(self._scratch)[:n]
+        return True
+
+    def _consume(self, count: int) -> bytes:
+        data = bytes(memoryview(self.buf)[self.pos : self.pos + count])
+        self.pos += count
+        if self.pos == len(self.buf):
+            self.buf.clear()
+            self.pos = 0
+        return data
+
+    def _read_delimited(self, delimiter: bytes) -> int:
+        """Fill until `delimiter` is seen; return its index, or -1 at EOF.
+        Bytes already searched are not rescanned after each recv."""
+        searched = 0
+        while True:
+            start = self.pos + max(searched - len(delimiter) + 1, 0)
+            end = self.buf.find(delimiter, start)
+            if end != -1:
+                return end
+            searched = self._pending()
+            if not self._fill():
+                return -1
+
+    def read_header_block(self) -> bytes:
+        """Return everything up to (but not including) the blank line that
+        terminates the headers, leaving any body bytes buffered."""
+        end = self._read_delimited(_HEADER_END)
+        if end == -1:
+            raise ConnectionError("connection closed by server")
+
+        block = self._consume(end - self.pos)
+        self._consume(len(_HEADER_END))
+        return block
+
+    def readline(self) -> bytes:
+        end = self._read_delimited(NEWLINE_BYTES)
+        if end == -1:
+            return self._consume(self._pending())
+
+        return self._consume(end - self.pos + len(NEWLINE_BYTES))
+
+    def read(self, size: int = -1) -> bytes:
+        if size < 0:
+            while self._fill():
+                pass
+            return self._consume(self._pending())
+
+        while self._pending() < size:
+            if not self._fill():
+                break
+        return self._consume(min(size, self._pending()))
+
+
+# Open keep-alive connections, keyed by (host, port, scheme). Each entry
+# pairs the socket with its reader so buffered bytes survive across
+# requests on the same connection.
+_POOL: Dict[Tuple[str, int, str], Tuple[socket, _SocketReader]] = {}
+
+# Origins that have been observed to mishandle pipelined requests; these
+# fall back to one-request-at-a-time in request_many.
+_NO_PIPELINING: Set[Tuple[str, int, str]] = set()
+
+# Created once: building a default context loads and parses the system
+# CA bundle, which costs tens of milliseconds per call.
+_TLS_CTX = ssl.create_default_context()
+
+# Most recent TLS session per (host, port), offered on reconnect so the
+# server can resume it and skip a round trip of the handshake.
+_TLS_SESSIONS: Dict[Tuple[str, int], "ssl.SSLSession"] = {}
+
+
+def _connect(parsed: URL) -> Tuple[socket, _SocketReader]:
+    s = socket(family=AF_INET, type=SOCK_STREAM, proto=IPPROTO_TCP)
 
-        if URL_PATH_SEP not in url:
-            url += URL_PATH_SEP
+    if parsed.scheme == "https":
+        s = _TLS_CTX.wrap_socket(
+            s,
+            server_hostname=parsed.host,
+            session=_TLS_SESSIONS.get((parsed.host, parsed.port)),
+        )
 
-        host, path = url.split(URL_PATH_SEP, maxsplit=1)
-        if ":" in host:
-            host, port = host.split(":", 1)
-            port = int(port)
+    s.connect((parsed.host, parsed.port))
+    if parsed.scheme == "https":
+        _TLS_SESSIONS[(parsed.host, parsed.port)] = s.session
+
+    return s, _SocketReader(s)
+
+
+class _BoundedReader:
+    """File-like view over exactly `length` bytes of an underlying reader,
+    so consumers cannot read past the end of one keep-alive response."""
+
+    def __init__(self, raw: _SocketReader, length: int) -> None:
+        self.raw = raw
+        self.remaining = length
+
+    def read(self, size: int = -1) -> bytes:
+        if self.remaining <= 0:
+            return b""
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.raw.read(size)
+        if len(data) < size:
+            # EOF before content-length bytes arrived: surface the
+            # truncation rather than passing off a partial body as the
+            # whole response (which would also poison the cache).
+            raise ConnectionError("connection closed mid-body")
+        self.remaining -= len(data)
+        return data
+
+
+class _ChunkedReader:
+    """File-like that decodes HTTP chunked transfer coding, consuming the
+    trailer section once the terminating zero-length chunk is seen."""
+
+    def __init__(self, raw: _SocketReader) -> None:
+        self.raw = raw
+        self.chunk_remaining = 0
+        self.done = False
+
+    def _next_chunk(self) -> None:
+        size = int(self.raw.readline().split(b";", 1)[0], 16)
+        if size == 0:
+            # Consume (empty) trailers up to the final blank line.
+            while self.raw.readline() not in (NEWLINE_BYTES, b""):
+                pass
+            self.done = True
+        self.chunk_remaining = size
+
+    def read(self, size: int = -1) -> bytes:
+        parts = []
+        while size != 0 and not self.done:
+            if self.chunk_remaining == 0:
+                self._next_chunk()
+                continue
+            take = self.chunk_remaining if size < 0 else min(size, self.chunk_remaining)
+            data = self.raw.read(take)
+            if len(data) < take:
+                # EOF inside chunk data; an OSError routes this through
+                # request()'s eviction handling instead of spinning here.
+                raise ConnectionError("connection closed mid-chunk")
+            parts.append(data)
+            self.chunk_remaining -= len(data)
+            if size > 0:
+                size -= len(data)
+            if self.chunk_remaining == 0:
+                self.raw.readline()  # CRLF terminating the chunk data
+
+        return b"".join(parts)
+
+
+def _body_reader(reader: _SocketReader, headers: Dict[str, str]):
+    if headers.get(HEADER_TRANSFER_ENCODING, "").lower() == TRANSFER_ENCODING_CHUNKED:
+        return _ChunkedReader(reader)
+
+    if HEADER_CONTENT_LENGTH in headers:
+        return _BoundedReader(reader, int(headers[HEADER_CONTENT_LENGTH]))
+
+    # No framing: the server signals the end of the body by closing.
+    return reader
+
+
+# Rendered to bytes once at import; per request only the path and host
+# are substituted in, at the bytes level.
+_REQUEST_TEMPLATE = (
+    f"GET %s HTTP/1.1{NEWLINE}"
+    f"Host: %s{NEWLINE}"
+    f"{HEADER_ACCEPT_ENCODING}: {ENCODING_GZIP}{NEWLINE}"
+    f"{HEADER_CONNECTION}: {CONNECTION_KEEP_ALIVE}{NEWLINE}"
+).encode(ENCODING_UTF8)
+
+
+def _build_request(parsed: URL, extra_headers: bytes = b"") -> bytes:
+    return (
+        _REQUEST_TEMPLATE
+        % (
+            parsed.path.encode("ascii"),
+            parsed.host.encode("ascii"),
+        )
+        + extra_headers
+        + NEWLINE_BYTES
+    )
 
-        path = URL_PATH_SEP + path
 
-        return URL(raw=raw, host=host, path=path, port=port, scheme=scheme)
+# How much body to pull through the reader chain per iteration; large
+# enough to amortize call overhead, small enough to stay cache-resident.
+_BODY_CHUNK_SIZE = 128 * 1024
+
+
+def _read_text(body, sink=None) -> str:
+    """Drain `body` through an incremental UTF-8 decoder, one chunk at a
+    time, so decoding overlaps inflate/network reads and the bytes are
+    traversed once instead of being reassembled and decoded in a second
+    full pass.
+
+    With a `sink`, each decoded chunk is handed over as it arrives (and
+    the empty string is returned); without one, the chunks are joined
+    into the full body text."""
+    decoder = codecs.getincrementaldecoder(ENCODING_UTF8)()
+    parts: List[str] = []
+    out = sink if sink is not None else parts.append
+    while chunk := body.read(_BODY_CHUNK_SIZE):
+        text = decoder.decode(chunk)
+        if text:
+            out(text)
+    text = decoder.decode(b"", final=True)
+    if text:
+        out(text)
+
+    return "".join(parts)
+
+
+def _read_response(reader: _SocketReader, sink=None) -> Tuple[str, Dict[str, str], str]:
+    block = reader.read_header_block()
+    statusline, _, header_block = block.partition(NEWLINE_BYTES)
+    version, status, explanation = statusline.decode(ENCODING_UTF8).split(" ", 2)
+    assert status in (STATUS_OK, STATUS_NOT_MODIFIED), "{}: {}".format(
+        status, explanation
+    )
 
+    headers = {}
+    for line in header_block.split(NEWLINE_BYTES):
+        if not line:
+            continue
+        header, value = line.split(b":", 1)
+        headers[header.decode(ENCODING_UTF8).lower()] = value.decode(
+            ENCODING_UTF8
+        ).strip()
+
+    if status == STATUS_NOT_MODIFIED:
+        # 304 carries no body (any content-length describes the entity
+        # that was *not* sent), so don't try to read one.
+        return status, headers, ""
+
+    body = _body_reader(reader, headers)
+    gzipped = headers.get(HEADER_CONTENT_ENCODING, "").lower() == ENCODING_GZIP
+
+    if gzipped and deflate is not None and sink is None:
+        # When the caller wants the whole body at once anyway, a single
+        # libdeflate call beats streaming zlib; streaming sinks stay on
+        # the overlapped path below.
+        return (
+            status,
+            headers,
+            deflate.gzip_decompress(body.read()).decode(ENCODING_UTF8),
+        )
 
-def request(url: str) -> Tuple[Dict[str, str], str]:
-    parsed = URL.parse(url)
-    s = socket(family=AF_INET, type=SOCK_STREAM, proto=IPPROTO_TCP)
+    if gzipped:
+        # Decompress incrementally off the socket so inflate overlaps
+        # the network reads instead of waiting for the whole compressed
+        # payload to be buffered first.
+        body = gzip.GzipFile(fileobj=body)
 
-    if parsed.scheme == "https":
-        ctx = ssl.create_default_context()
-        s = ctx.wrap_socket(s, server_hostname=parsed.host)
+    return status, headers, _read_text(body, sink)
 
-    s.connect((parsed.host, parsed.port))
-    s.send(
-        f"GET {parsed.path} HTTP/1.0{NEWLINE}Host: {parsed.host}{NEWLINE}{HEADER_ACCEPT_ENCODING}: {ENCODING_GZIP}{NEWLINE}{NEWLINE}".encode(
+
+def _keeps_alive(status: str, headers: Dict[str, str]) -> bool:
+    if headers.get(HEADER_CONNECTION, "").lower() == CONNECTION_CLOSE:
+        return False
+    if status == STATUS_NOT_MODIFIED:
+        # Bodyless, so no framing is needed to find the response's end.
+        return True
+
+    return (
+        HEADER_CONTENT_LENGTH in headers
+        or headers.get(HEADER_TRANSFER_ENCODING, "").lower() == TRANSFER_ENCODING_CHUNKED
+    )
+
+
+class _Cache:
+    """On-disk HTTP cache keyed by URL, one JSON file per entry. Entries
+    hold the response headers, body text, and when they were stored --
+    enough for Cache-Control freshness checks and ETag / Last-Modified
+    revalidation. All I/O is best-effort: a missing or unreadable entry
+    is simply a miss."""
+
+    def __init__(self, directory: str) -> None:
+        self.directory = directory
+
+    def _path(self, url: str) -> str:
+        name = hashlib.sha256(url.encode(ENCODING_UTF8)).hexdigest()
+        return os.path.join(self.directory, name + ".json")
+
+    def get(self, url: str):
+        try:
+            with open(self._path(url), encoding=ENCODING_UTF8) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def put(self, url: str, headers: Dict[str, str], body: str) -> None:
+        # Drop headers that describe the wire entity (compressed, framed);
+        # the stored body is decoded text, so serving them back with it
+        # would invite a second decompression.
+        headers = {
+            header: value
+            for header, value in headers.items()
+            if header
+            not in (
+                HEADER_CONTENT_ENCODING,
+                HEADER_CONTENT_LENGTH,
+                HEADER_TRANSFER_ENCODING,
+            )
+        }
+        entry = {
+            "url": url,
+            "stored_at": time.time(),
+            "headers": headers,
+            "body": body,
+        }
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(self._path(url), "w", encoding=ENCODING_UTF8) as f:
+                json.dump(entry, f)
+        except OSError:
+            pass
+
+
+_CACHE = _Cache(os.path.join(os.path.expanduser("~"), ".cache", "build-a-browser"))
+
+
+def _max_age(headers: Dict[str, str]):
+    for directive in headers.get(HEADER_CACHE_CONTROL, "").lower().split(","):
+        directive = directive.strip()
+        if directive.startswith("max-age="):
+            try:
+                return int(directive[len("max-age=") :])
+            except ValueError:
+                return None
+
+    return None
+
+
+def _is_fresh(entry) -> bool:
+    cache_control = entry["headers"].get(HEADER_CACHE_CONTROL, "").lower()
+    if "no-cache" in cache_control:
+        return False
+    max_age = _max_age(entry["headers"])
+
+    return max_age is not None and time.time() < entry["stored_at"] + max_age
+
+
+def _is_cacheable(headers: Dict[str, str]) -> bool:
+    if "no-store" in headers.get(HEADER_CACHE_CONTROL, "").lower():
+        return False
+
+    # Without a validator or a freshness lifetime the entry could never
+    # be served or revalidated, so don't bother storing it.
+    return (
+        HEADER_ETAG in headers
+        or HEADER_LAST_MODIFIED in headers
+        or _max_age(headers) is not None
+    )
+
+
+def _conditional_headers(entry) -> bytes:
+    if entry is None:
+        return b""
+
+    extra = b""
+    etag = entry["headers"].get(HEADER_ETAG)
+    if etag:
+        extra += f"{HEADER_IF_NONE_MATCH}: {etag}{NEWLINE}".encode(ENCODING_UTF8)
+    last_modified = entry["headers"].get(HEADER_LAST_MODIFIED)
+    if last_modified:
+        extra += f"{HEADER_IF_MODIFIED_SINCE}: {last_modified}{NEWLINE}".encode(
             ENCODING_UTF8
         )
-    )
-    response: BytesIO = s.makefile("rb", encoding=ENCODING_UTF8, newline=NEWLINE)
-    statusline = response.readline().decode(ENCODING_UTF8)
-    version, status, explanation = statusline.split(" ", 2)
-    assert status == "200", "{}: {}".format(status, explanation)
 
-    headers = {}
-    while True:
-        line = response.readline().decode(ENCODING_UTF8)
-        if line == NEWLINE:
-            break
-        header, value = line.split(":", 1)
-        headers[header.lower()] = value.strip()
-
-    encoding = headers.get(HEADER_CONTENT_ENCODING, "")
-    if encoding.lower() == ENCODING_GZIP:
-        body = gzip.decompress(response.read()).decode(ENCODING_UTF8)
+    return extra
+
+
+class _SinkGuard:
+    """Wraps a streaming sink so the stale-connection retry in request()
+    can tell whether any chunks were already delivered, and keeps the
+    chunks so the full body can still be cached."""
+
+    def __init__(self, sink) -> None:
+        self.sink = sink
+        self.fed = False
+        self.parts: List[str] = []
+
+    def __call__(self, chunk: str) -> None:
+        self.fed = True
+        self.parts.append(chunk)
+        self.sink(chunk)
+
+
+def request(url: str, sink=None) -> Tuple[Dict[str, str], str]:
+    """Fetch `url`. With a `sink`, decoded body text is streamed into it
+    chunk by chunk as bytes arrive -- letting the caller lex/process the
+    page while the tail is still in flight -- and the returned body is
+    the empty string.
+
+    Responses with cache validators or a freshness lifetime are stored
+    on disk; fresh entries are served without touching the network, and
+    stale ones are revalidated with a conditional request so a 304 skips
+    the transfer entirely."""
+    entry = _CACHE.get(url)
+    if entry is not None and _is_fresh(entry):
+        if sink is not None:
+            sink(entry["body"])
+            return entry["headers"], ""
+        return entry["headers"], entry["body"]
+
+    parsed = URL.parse(url)
+    origin = (parsed.host, parsed.port, parsed.scheme)
+
+    reused = origin in _POOL
+    s, reader = _POOL[origin] if reused else _connect(parsed)
+
+    if sink is not None:
+        sink = _SinkGuard(sink)
+
+    req = _build_request(parsed, _conditional_headers(entry))
+    try:
+        try:
+            s.sendall(req)
+            status, headers, body = _read_response(reader, sink)
+        except OSError:
+            # A pooled connection may have been closed by the server
+            # while idle; evict it and retry once on a fresh connection
+            # -- unless part of the body already went to the sink.
+            _POOL.pop(origin, None)
+            s.close()
+            if not reused or (sink is not None and sink.fed):
+                raise
+            s, reader = _connect(parsed)
+            s.sendall(req)
+            status, headers, body = _read_response(reader, sink)
+    except (AssertionError, ValueError):
+        # Non-200 or a malformed response leaves unread bytes on the
+        # connection; don't leave it desynced in the pool.
+        _POOL.pop(origin, None)
+        s.close()
+        raise
+
+    if _keeps_alive(status, headers):
+        _POOL[origin] = (s, reader)
     else:
-        body = response.read().decode(ENCODING_UTF8)
+        _POOL.pop(origin, None)
+        s.close()
+
+    if status == STATUS_NOT_MODIFIED:
+        headers, body = entry["headers"], entry["body"]
+        _CACHE.put(url, headers, body)  # restart the freshness clock
+        if sink is not None:
+            sink.sink(body)
+            return headers, ""
+        return headers, body
 
-    s.close()
+    if _is_cacheable(headers):
+        full_body = body if sink is None else "".join(sink.parts)
+        _CACHE.put(url, headers, full_body)
 
     return headers, body
 
 
+def _request_pipelined(
+    origin: Tuple[str, int, str],
+    group: List[Tuple[int, URL]],
+    results: List,
+) -> int:
+    """Send every request in `group` before reading any response, filling
+    `results` by index. Returns how many responses were successfully read;
+    a short count means the origin mishandled pipelining."""
+    reused = origin in _POOL
+    s, reader = _POOL[origin] if reused else _connect(group[0][1])
+    req = b"".join(_build_request(parsed) for _, parsed in group)
+
+    done = 0
+    keep = False
+    try:
+        s.sendall(req)
+        for index, parsed in group:
+            status, headers, body = _read_response(reader)
+            results[index] = (headers, body)
+            done += 1
+            keep = _keeps_alive(status, headers)
+            if not keep:
+                break
+    except (OSError, ValueError):
+        keep = False
+    except AssertionError:
+        # Non-200: surface it like request() does, but don't leave a
+        # desynced connection behind in the pool.
+        _POOL.pop(origin, None)
+        s.close()
+        raise
+
+    if done == len(group) and keep:
+        _POOL[origin] = (s, reader)
+    else:
+        _POOL.pop(origin, None)
+        s.close()
+
+    if done == 0 and reused:
+        # Nothing came back on a pooled connection: that is a stale
+        # socket, not a pipelining failure. Retry once on a fresh one.
+        return _request_pipelined(origin, group, results)
+
+    return done
+
+
+def request_many(urls: List[str]) -> List[Tuple[Dict[str, str], str]]:
+    """Fetch several URLs, pipelining requests that share an origin on a
+    single keep-alive connection. Responses are returned in input order."""
+    by_origin: Dict[Tuple[str, int, str], List[Tuple[int, URL]]] = {}
+    for index, url in enumerate(urls):
+        parsed = URL.parse(url)
+        origin = (parsed.host, parsed.port, parsed.scheme)
+        by_origin.setdefault(origin, []).append((index, parsed))
+
+    results: List = [None] * len(urls)
+    for origin, group in by_origin.items():
+        pending = group
+        if len(group) > 1 and origin not in _NO_PIPELINING:
+            done = _request_pipelined(origin, group, results)
+            pending = group[done:]
+            if pending:
+                _NO_PIPELINING.add(origin)
+        for index, parsed in pending:
+            results[index] = request(parsed.raw)
+
+    return results
+
+
+# Matches a tag from "<" through ">"; the ">" is optional so a dangling
+# unterminated "<..." at the end of the body is stripped too.
+_TAG_RE = re.compile(r"<[^>]*>?", re.DOTALL)
+
+
 def lex(body: str) -> str:
-    text = ""
-    in_angle = False
-    for c in body:
-        if c == "<":
-            in_angle = True
-        elif c == ">":
-            in_angle = False
-        elif not in_angle:
-            text += c
+    return _TAG_RE.sub("", body)
+
 
-    return text
+class IncrementalLexer:
+    """Strips tags from body text that arrives in chunks, carrying the
+    inside-a-tag state across feeds so a tag split between two network
+    reads is still recognized. Feeding this from a streaming request
+    lets lexing run while the rest of the page is still in flight."""
+
+    def __init__(self) -> None:
+        self.in_angle = False
+        self.parts: List[str] = []
+
+    def feed(self, chunk: str) -> None:
+        """Scan with find() jumps between "<" and ">" and append whole
+        text slices, so all the heavy lifting happens in C-level string
+        primitives instead of one bytecode loop per character."""
+        parts = self.parts
+        pos = 0
+        end = len(chunk)
+        while pos < end:
+            if self.in_angle:
+                close = chunk.find(">", pos)
+                if close == -1:
+                    return
+                self.in_angle = False
+                pos = close + 1
+            else:
+                opening = chunk.find("<", pos)
+                if opening == -1:
+                    parts.append(chunk[pos:])
+                    return
+                if opening > pos:
+                    parts.append(chunk[pos:opening])
+                self.in_angle = True
+                pos = opening + 1
+
+    def text(self) -> str:
+        return "".join(self.parts)
 
 
 def load(url: str):
@@ -154,34 +745,75 @@ class Browser:
             height=HEIGHT,
         )
         self.canvas.pack()
-        self.display_list: List[Character] = []
+        self.xs = array("i")
+        self.ys = array("i")
+        self.lines: List[str] = []
+        self.item_ids: List[int] = []
+        self.visible = (0, 0)
         self.scroll = 0
         self.window.bind("<Down>", self.scroll_down)
         self.window.bind("<Up>", self.scroll_up)
 
     def scroll_down(self, e: Event):
-        self.scroll += SCROLL_STEP
-        self.draw()
+        self._scroll_to(self.scroll + SCROLL_STEP)
 
     def scroll_up(self, e: Event):
-        _last = self.scroll
-        self.scroll = max(self.scroll - SCROLL_STEP, 0)
-        if _last != self.scroll:
-            self.draw()
+        scroll = max(self.scroll - SCROLL_STEP, 0)
+        if scroll != self.scroll:
+            self._scroll_to(scroll)
+
+    def _visible_range(self) -> Tuple[int, int]:
+        # ys is non-decreasing, so the visible rows form one contiguous
+        # slice; find it in O(log n) instead of scanning the whole page.
+        lo = bisect_left(self.ys, self.scroll - VSTEP)
+        hi = bisect_right(self.ys, self.scroll + HEIGHT)
+        return lo, hi
 
     def draw(self):
+        """Create the canvas items, one per row; rows outside the viewport
+        start hidden. Called once per load -- scrolling shifts the
+        existing items (_scroll_to) instead of recreating them."""
         self.canvas.delete("all")
-        for d in self.display_list:
-            if d.loc.y > self.scroll + HEIGHT:
-                continue
-            if d.loc.y + VSTEP < self.scroll:
-                continue
-            self.canvas.create_text(d.loc.x, d.loc.y - self.scroll, text=d.char)
+        lo, hi = self._visible_range()
+        self.item_ids = [
+            self.canvas.create_text(
+                self.xs[i],
+                self.ys[i] - self.scroll,
+                text=self.lines[i],
+                anchor="w",
+                font=FIXED_FONT,
+                state="normal" if lo <= i < hi else "hidden",
+            )
+            for i in range(len(self.lines))
+        ]
+        self.visible = (lo, hi)
+
+    def _scroll_to(self, scroll: int):
+        dy = scroll - self.scroll
+        self.scroll = scroll
+        self.canvas.move("all", 0, -dy)
+
+        old_lo, old_hi = self.visible
+        lo, hi = self._visible_range()
+        # Both the old and new visible sets are contiguous index ranges,
+        # so the rows to hide/show are their interval differences; touch
+        # exactly those instead of membership-testing every visible row.
+        itemconfigure = self.canvas.itemconfigure
+        item_ids = self.item_ids
+        for i in range(old_lo, min(old_hi, lo)):
+            itemconfigure(item_ids[i], state="hidden")
+        for i in range(max(old_lo, hi), old_hi):
+            itemconfigure(item_ids[i], state="hidden")
+        for i in range(lo, min(hi, old_lo)):
+            itemconfigure(item_ids[i], state="normal")
+        for i in range(max(lo, old_hi), hi):
+            itemconfigure(item_ids[i], state="normal")
+        self.visible = (lo, hi)
 
     def load(self, url: str):
-        headers, body = request(url=url)
-        text = lex(body=body)
-        self.display_list = layout(text)
+        lexer = IncrementalLexer()
+        headers, _ = request(url=url, sink=lexer.feed)
+        self.xs, self.ys, self.lines = layout(lexer.text())
         self.draw()
 
 